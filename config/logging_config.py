@@ -1,7 +1,72 @@
+import atexit
 import logging
 import logging.handlers
 import os
-from .service_config import config
+import queue
+from config.service_config import config
+
+# 不采集线程、进程信息，并跳过findCaller的栈帧查找，降低每条日志的开销
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+logging._srcfile = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """进程内队列处理器：直接入队原始记录，消息格式化交给后台监听线程完成"""
+
+    def prepare(self, record):
+        return record
+
+
+class _DeferredFlushFileHandler(logging.handlers.RotatingFileHandler):
+    """写入记录后不逐条flush，由监听线程在队列清空时统一刷新
+
+    RotatingFileHandler.shouldRollover每条记录都会seek到文件末尾，这会刷新文本流缓冲区；
+    这里改为自行累计已写入的字节数来判断是否滚动。
+    """
+
+    def _open(self):
+        stream = super()._open()
+        self._bytes_written = os.path.getsize(self.baseFilename)
+        return stream
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            size = len(msg.encode(self.encoding or "utf-8"))
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self._bytes_written + size >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(msg)
+            self._bytes_written += size
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        pass
+
+    def flush_buffer(self):
+        super().flush()
+
+
+class _DrainFlushQueueListener(logging.handlers.QueueListener):
+    """队列清空时才刷新文件处理器，一批记录只产生一次flush"""
+
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            self._flush_handlers()
+
+    def stop(self):
+        super().stop()
+        self._flush_handlers()
+
+    def _flush_handlers(self):
+        for handler in self.handlers:
+            if isinstance(handler, _DeferredFlushFileHandler):
+                handler.flush_buffer()
 
 
 def setup_logging():
@@ -13,7 +78,7 @@ def setup_logging():
 
     # 创建格式化器
     formatter = logging.Formatter(
-        '%(asctime)s | %(thread)d | %(levelname)s | [%(filename)s:%(lineno)d] | %(message)s'
+        '%(asctime)s | %(levelname)s | %(name)s | %(message)s'
     )
 
     # 获取根日志记录器
@@ -25,7 +90,7 @@ def setup_logging():
         root_logger.removeHandler(handler)
 
     # 主日志文件 - 使用RotatingFileHandler自动滚动
-    file_handler = logging.handlers.RotatingFileHandler(
+    file_handler = _DeferredFlushFileHandler(
         config.log_file,
         maxBytes=100 * 1024 * 1024,  # 100MB
         backupCount=10,  # 保留10个备份文件
@@ -37,15 +102,24 @@ def setup_logging():
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
 
-    # 添加处理器
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    # 通过队列异步写日志，请求线程只负责入队，磁盘I/O由后台监听线程完成
+    log_queue = queue.Queue(-1)
+    root_logger.addHandler(_DeferredQueueHandler(log_queue))
+    listener = _DrainFlushQueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
 
     # 设置第三方库日志级别
     logging.getLogger("transformers").setLevel(logging.WARNING)
     logging.getLogger("sentence_transformers").setLevel(logging.INFO)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
 
+    # 关闭uvicorn自带的访问日志，避免与access日志重复记录
+    logging.getLogger("uvicorn.access").disabled = True
+    logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
+
     # 设置访问日志
     setup_access_logging()
 
@@ -56,14 +130,14 @@ def setup_access_logging():
     """设置访问日志"""
     access_log_file = config.log_file.replace('.log', '_access.log')
 
-    access_handler = logging.handlers.RotatingFileHandler(
+    access_handler = _DeferredFlushFileHandler(
         access_log_file,
         maxBytes=50 * 1024 * 1024,  # 50MB
         backupCount=5,
         encoding='utf-8'
     )
     access_handler.setFormatter(logging.Formatter(
-        '%(asctime)s | %(thread)d | %(levelname)s | [%(filename)s:%(lineno)d] | %(message)s'
+        '%(asctime)s | %(levelname)s | %(message)s'
     ))
 
     access_logger = logging.getLogger('access')
@@ -74,7 +148,13 @@ def setup_access_logging():
     for handler in access_logger.handlers[:]:
         access_logger.removeHandler(handler)
 
-    access_logger.addHandler(access_handler)
+    access_queue = queue.Queue(-1)
+    access_logger.addHandler(_DeferredQueueHandler(access_queue))
+    listener = _DrainFlushQueueListener(
+        access_queue, access_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
 
 
 # 初始化日志
@@ -1,5 +1,21 @@
 import os
 from dataclasses import dataclass
+from functools import lru_cache
+
+# CUDA可用性检测结果，避免重复探测CUDA运行时
+_CUDA_OK = None
+
+
+def _cuda_available() -> bool:
+    """检测CUDA是否可用（结果缓存）"""
+    global _CUDA_OK
+    if _CUDA_OK is None:
+        try:
+            import torch
+            _CUDA_OK = torch.cuda.is_available()
+        except ImportError:
+            _CUDA_OK = False
+    return _CUDA_OK
 
 
 @dataclass
@@ -18,6 +34,16 @@ class ServiceConfig:
     batch_size: int = 32
     device: str = "cuda"
     use_fp16: bool = True
+    use_torch_compile: bool = True
+    use_onnx: bool = False  # 使用ONNX Runtime推理（需安装optimum[onnxruntime]）
+    onnx_dir: str = "/opt/reranker-service/onnx"  # ONNX导出模型保存目录（按模型分子目录）
+
+    # 动态批处理设置
+    batch_wait_ms: float = 5.0  # 等待合并并发请求的时间窗口
+    max_batch_documents: int = 256  # 单次合并推理的最大文档数
+
+    # 响应缓存设置
+    response_cache_max_mb: int = 64  # 缓存响应的总大小上限(MB)，0表示关闭
 
     # 日志配置
     log_level: str = "INFO"
@@ -26,12 +52,7 @@ class ServiceConfig:
     def __post_init__(self):
         """初始化后处理"""
         # 自动检测设备
-        try:
-            import torch
-            if not torch.cuda.is_available():
-                self.device = "cpu"
-                self.use_fp16 = False
-        except ImportError:
+        if not _cuda_available():
             self.device = "cpu"
             self.use_fp16 = False
 
@@ -53,5 +74,11 @@ class ServiceConfig:
         if os.getenv("CUDA_VISIBLE_DEVICES"):
             self.device = "cuda"
 
+@lru_cache(maxsize=None)
+def get_config() -> ServiceConfig:
+    """获取全局唯一的配置实例"""
+    return ServiceConfig()
+
+
 # 全局配置实例
-config = ServiceConfig()
\ No newline at end of file
+config = get_config()
\ No newline at end of file
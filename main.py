@@ -1,3 +1,8 @@
+import os
+
+# 可扩展显存段，减少CUDA缓存分配器的碎片（需在CUDA初始化前设置）
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
 from config.service_config import config
 from server.http_server import init_fastapi
 
@@ -9,6 +14,10 @@ if __name__ == "__main__":
         app,
         host=config.host,
         port=config.port,
+        # 单GPU部署保持workers=1，由动态批处理提升吞吐
         workers=config.workers,
-        log_config=None  # 使用自定义日志配置
+        loop="uvloop",  # C实现的事件循环
+        http="httptools",  # C实现的HTTP解析
+        log_config=None,  # 使用自定义日志配置
+        access_log=False  # 访问日志由log_requests中间件记录
     )
\ No newline at end of file
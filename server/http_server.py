@@ -1,14 +1,18 @@
+import asyncio
+import logging
 import time
 from contextlib import asynccontextmanager
 
 import psutil
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from config.service_config import config
 from config.logging_config import logger, access_logger
 from server.model.bge_reranker import reranker_model, BGEReranker
+from server.rerank_batcher import rerank_batcher, RerankBatcher
+from server.response_cache import response_cache, make_cache_key
 from server.schema.request import RerankRequest
 from server.schema.response import RerankResponse, HealthResponse, ErrorResponse
 
@@ -21,11 +25,40 @@ router = APIRouter(
     tags=["model server"]     # 标签，用于API文档分组
 )
 
+# 系统信息刷新间隔（秒）
+SYSINFO_REFRESH_INTERVAL = 2.0
+
+
+def _collect_sysinfo(process: psutil.Process) -> dict:
+    """采集进程内存和CPU占用"""
+    memory_info = process.memory_info()
+    return {
+        "memory_used_mb": round(memory_info.rss / 1024 / 1024, 2),
+        "cpu_percent": round(process.cpu_percent(interval=None), 2)
+    }
+
+
+async def _refresh_sysinfo(app: FastAPI):
+    """后台定时刷新系统信息，健康检查直接读取缓存"""
+    process = psutil.Process()
+    while True:
+        try:
+            app.state.sysinfo = _collect_sysinfo(process)
+        except Exception as e:
+            logger.warning("系统信息采集失败: %s", e)
+        await asyncio.sleep(SYSINFO_REFRESH_INTERVAL)
+
+
 # 依赖注入：获取模型实例
 def get_reranker() -> BGEReranker:
     return reranker_model
 
 
+# 依赖注入：获取动态批处理实例
+def get_batcher() -> RerankBatcher:
+    return rerank_batcher
+
+
 # API端点
 # include_in_schema: 控制该路由是否包含在自动生成的OpenAPI文档（如Swagger UI）中
 @router.get("/", include_in_schema=False)
@@ -38,16 +71,12 @@ async def root():
     }
 
 @router.get("/health", response_model=HealthResponse)
-async def health_check(reranker: BGEReranker = Depends(get_reranker)):
+async def health_check(request: Request, reranker: BGEReranker = Depends(get_reranker)):
     """健康检查端点"""
     try:
-        # 系统信息
-        process = psutil.Process()
-        memory_info = process.memory_info()
-
+        # 系统信息（由后台任务定时刷新）
         system_info = {
-            "memory_used_mb": round(memory_info.rss / 1024 / 1024, 2),
-            "cpu_percent": round(process.cpu_percent(), 2),
+            **getattr(request.app.state, "sysinfo", {}),
             "service_uptime": round(time.time() - startup_time, 2)
         }
 
@@ -60,44 +89,58 @@ async def health_check(reranker: BGEReranker = Depends(get_reranker)):
         )
 
     except Exception as e:
-        logger.error(f"健康检查失败: {str(e)}")
+        logger.error("健康检查失败: %s", e)
         raise HTTPException(status_code=500, detail="健康检查失败")
 
 
 @router.post("/rerank", response_model=RerankResponse)
 async def rerank_documents(
         request: RerankRequest,
-        reranker: BGEReranker = Depends(get_reranker)
+        reranker: BGEReranker = Depends(get_reranker),
+        batcher: RerankBatcher = Depends(get_batcher)
 ):
     """重排序API端点"""
     try:
         if not reranker.is_loaded:
             raise HTTPException(status_code=503, detail="模型未加载，服务不可用")
 
-        # 参数验证
-        if request.top_k > len(request.documents):
-            request.top_k = len(request.documents)
+        # 相同的(query, documents, top_k, batch_size)直接返回缓存的响应；单文档无需排序，不缓存
+        # 缓存的响应中processing_time等指标为首次计算时的值
+        cache_key = None
+        if len(request.documents) > 1:
+            cache_key = make_cache_key(
+                request.query, request.documents, request.top_k, request.batch_size or config.batch_size
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                reranker.record_cached_query()
+                return Response(content=cached, media_type="application/json")
 
-        # 执行重排序
-        ranked_documents, scores, metrics = reranker.rerank(
+        # 执行重排序（与并发请求合并推理）
+        ranked_documents, scores, metrics = await batcher.rerank(
             query=request.query,
             documents=request.documents,
             top_k=request.top_k,
             batch_size=request.batch_size
         )
 
-        return RerankResponse(
+        response = RerankResponse(
             success=True,
             ranked_documents=ranked_documents,
             scores=scores,
             processing_time=metrics["processing_time"],
             metrics=metrics
         )
+        # 直接返回ORJSONResponse，跳过FastAPI对response_model的二次校验和序列化
+        json_response = ORJSONResponse(content=response.model_dump())
+        if cache_key is not None:
+            response_cache.put(cache_key, json_response.body)
+        return json_response
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"重排序处理异常: {str(e)}", exc_info=True)
+        logger.error("重排序处理异常: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"内部服务器错误: {str(e)}")
 
 
@@ -112,8 +155,8 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动逻辑
     logger.info("=== 启动重排序服务 ===")
-    logger.info(f"服务地址: http://{config.host}:{config.port}")
-    logger.info(f"模型名称: {config.model_name}")
+    logger.info("服务地址: http://%s:%d", config.host, config.port)
+    logger.info("模型名称: %s", config.model_name)
 
     # 加载模型
     success = reranker_model.load_model()
@@ -121,12 +164,18 @@ async def lifespan(app: FastAPI):
         logger.error("模型加载失败，服务无法启动")
         raise RuntimeError("模型加载失败")
 
+    rerank_batcher.start()
+    await rerank_batcher.warmup()
+    app.state.sysinfo = {}
+    sysinfo_task = asyncio.create_task(_refresh_sysinfo(app))
     logger.info("=== 服务启动完成 ===")
 
     yield  # 这里应用会运行
 
     # 关闭逻辑
     logger.info("=== 关闭重排序服务 ===")
+    sysinfo_task.cancel()
+    await rerank_batcher.stop()
 
 def init_fastapi() -> FastAPI:
     app = FastAPI(
@@ -135,7 +184,8 @@ def init_fastapi() -> FastAPI:
         version="1.0.0",
         docs_url="/docs",
         redoc_url="/redoc",
-        lifespan=lifespan  # 使用lifespan替代startup/shutdown事件
+        lifespan=lifespan,  # 使用lifespan替代startup/shutdown事件
+        default_response_class=ORJSONResponse  # 使用orjson序列化响应
     )
     app.include_router(router)
 
@@ -155,18 +205,21 @@ def init_fastapi() -> FastAPI:
         try:
             response = await call_next(request)
 
-            process_time = (time.time() - start_time) * 1000
-            access_logger.info(
-                f"{request.client.host} - \"{request.method} {request.url.path}\" "
-                f"{response.status_code} - {process_time:.2f}ms"
-            )
+            if access_logger.isEnabledFor(logging.INFO):
+                process_time = (time.time() - start_time) * 1000
+                access_logger.info(
+                    "%s - \"%s %s\" %d - %.2fms",
+                    request.client.host, request.method, request.url.path,
+                    response.status_code, process_time
+                )
             return response
         except Exception as e:
             process_time = (time.time() - start_time) * 1000
-            logger.error(f"请求处理异常: {str(e)}", exc_info=True)
+            logger.error("请求处理异常: %s", e, exc_info=True)
             access_logger.error(
-                f"{request.client.host} - \"{request.method} {request.url.path}\" "
-                f"ERROR - {process_time:.2f}ms - {str(e)}"
+                "%s - \"%s %s\" ERROR - %.2fms - %s",
+                request.client.host, request.method, request.url.path,
+                process_time, e
             )
             raise
 
@@ -174,7 +227,7 @@ def init_fastapi() -> FastAPI:
     @app.exception_handler(Exception)
     async def global_exception_handler(request: Request, exc: Exception):
         """全局异常处理"""
-        logger.error(f"未处理的异常: {str(exc)}", exc_info=True)
+        logger.error("未处理的异常: %s", exc, exc_info=True)
 
         return JSONResponse(
             status_code=500,
@@ -1,3 +1,5 @@
+import hashlib
+import os
 import time
 import numpy as np
 from typing import List, Tuple, Optional, Dict, Any
@@ -8,6 +10,50 @@ from sentence_transformers import CrossEncoder
 from config.service_config import config
 from config.logging_config import logger
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _score_stats_numpy(a: np.ndarray) -> Tuple[float, float, float]:
+    """计算分数的(平均值, 最小值, 最大值)"""
+    return float(a.mean()), float(a.min()), float(a.max())
+
+
+if numba is not None:
+    # 按输入数组的dtype编译，不做类型转换拷贝；求和使用float64累加
+    @numba.njit(cache=True, fastmath=True)
+    def _score_stats_kernel(a):
+        s = 0.0
+        mn = a[0]
+        mx = a[0]
+        for i in range(a.size):
+            v = a[i]
+            s += v
+            mn = min(mn, v)
+            mx = max(mx, v)
+        return s / a.size, mn, mx
+
+    def _score_stats(a: np.ndarray) -> Tuple[float, float, float]:
+        """单次遍历计算分数的(平均值, 最小值, 最大值)"""
+        avg, mn, mx = _score_stats_kernel(a)
+        return float(avg), float(mn), float(mx)
+else:
+    _score_stats = _score_stats_numpy
+
+
+# torch.compile启用时序列长度按该粒度向上取整，限制不同输入形状的数量
+COMPILE_LENGTH_BUCKET = 64
+
+
+def _find_subsequence(sequence: List[int], sub: List[int], start: int) -> int:
+    """返回sub在sequence中从start开始首次出现的位置"""
+    for i in range(start, len(sequence) - len(sub) + 1):
+        if sequence[i:i + len(sub)] == sub:
+            return i
+    raise ValueError("无法从分词器推导句对模板")
+
 
 class BGEReranker:
     """BGE重排序模型封装"""
@@ -15,54 +61,143 @@ class BGEReranker:
     def __init__(self):
         self.logger = logger.getChild('model')
         self.model = None
+        self._forward = None
+        self.tokenizer = None
+        self._pair_prefix: List[int] = []
+        self._pair_middle: List[int] = []
+        self._pair_suffix = np.empty(0, dtype=np.int64)
+        self._input_buffers: Dict[str, torch.Tensor] = {}
+        self._pad_multiple = 1
         self.model_name = config.model_name
         self.device = config.device
         self.is_loaded = False
         self.load_time = 0
         self.total_queries = 0
         self.total_processing_time = 0
+        self.cache_hits = 0
 
     def load_model(self) -> bool:
         """加载模型"""
         try:
-            self.logger.info(f"开始加载模型: {self.model_name}")
+            self.logger.info("开始加载模型: %s", self.model_name)
             start_time = time.time()
 
-            # 加载模型
+            # 加载模型；ONNX模式下CrossEncoder只提供分词器和激活函数，放在CPU上不占显存
             self.model = CrossEncoder(
                 self.model_name,
                 max_length=config.max_length,
-                device=self.device
+                device="cpu" if config.use_onnx else self.device
             )
-
-            # FP16优化
-            if config.use_fp16:
-                if self.device == "cuda" and torch.cuda.is_available():
-                    self.model.model.half()
-                    self.logger.info("已启用FP16精度优化")
-                elif self.device == "cpu":
-                    self.logger.warning("FP16不支持CPU，已禁用")
-                    config.use_fp16 = False  # 禁用后续 FP16
+            self.tokenizer = self.model.tokenizer
+            self._build_pair_template()
+
+            if self.device == "cuda" and torch.cuda.is_available():
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.benchmark = True
+
+            if config.use_onnx:
+                self._forward = self._load_onnx_model()
+            else:
+                self._forward = self._optimize_torch_model()
+
+            # 预分配GPU输入缓冲区，推理时复用，避免每批重复申请显存（ONNX模式不使用，见_predict_grouped）
+            if self.device == "cuda" and torch.cuda.is_available() and not config.use_onnx:
+                buffer_size = config.batch_size * config.max_length
+                self._input_buffers = {
+                    name: torch.zeros(buffer_size, dtype=torch.long, device=self.device)
+                    for name in self.tokenizer.model_input_names
+                }
 
             self.load_time = time.time() - start_time
             self.is_loaded = True
 
-            self.logger.info(f"模型加载成功: {self.model_name}")
-            self.logger.info(f"加载耗时: {self.load_time:.2f}秒")
-            self.logger.info(f"模型设备: {self.device}, 最大长度: {config.max_length}")
-
-            # 预热模型
-            self._warmup()
+            self.logger.info("模型加载成功: %s", self.model_name)
+            self.logger.info("加载耗时: %.2f秒", self.load_time)
+            self.logger.info("模型设备: %s, 最大长度: %d", self.device, config.max_length)
 
             return True
 
         except Exception as e:
-            self.logger.error(f"模型加载失败: {str(e)}", exc_info=True)
+            self.logger.error("模型加载失败: %s", e, exc_info=True)
             self.is_loaded = False
             return False
 
-    def _warmup(self):
-        """预热模型"""
+    def _optimize_torch_model(self):
+        """PyTorch推理优化：FP16和torch.compile，返回用于推理的模块"""
+        # FP16优化
+        if config.use_fp16:
+            if self.device == "cuda" and torch.cuda.is_available():
+                self.model.model.half()
+                self.logger.info("已启用FP16精度优化")
+            elif self.device == "cpu":
+                self.logger.warning("FP16不支持CPU，已禁用")
+                config.use_fp16 = False  # 禁用后续 FP16
+
+        # torch.compile编译前向计算，减少Python调度开销
+        # 不使用CUDA graph（reduce-overhead会为每个输入形状单独录制graph），序列长度按桶对齐
+        if config.use_torch_compile and self.device == "cuda" and torch.cuda.is_available():
+            try:
+                compiled = torch.compile(
+                    self.model.model,
+                    dynamic=True,
+                    fullgraph=False
+                )
+                self._pad_multiple = COMPILE_LENGTH_BUCKET
+                self.logger.info("已启用torch.compile")
+                return compiled
+            except Exception as e:
+                self.logger.warning("torch.compile已禁用: %s", e)
+
+        return self.model.model
+
+    def _restore_eager_model(self) -> bool:
+        """torch.compile在首次前向时才真正编译，失败时恢复为未编译的模型"""
+        eager_model = getattr(self._forward, "_orig_mod", None)
+        if eager_model is None:
+            return False
+        self._forward = eager_model
+        self._pad_multiple = 1
+        return True
+
+    def _load_onnx_model(self):
+        """加载ONNX模型并用ONNX Runtime推理，CPU上使用INT8动态量化；已导出的模型直接复用"""
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        use_cuda = self.device == "cuda" and torch.cuda.is_available()
+        provider = "CUDAExecutionProvider" if use_cuda else "CPUExecutionProvider"
+        # INT8动态量化只在CPU上有收益，GPU使用CUDAExecutionProvider直接推理
+        file_name = "model.onnx" if use_cuda else "model_quantized.onnx"
+        # 每个模型使用独立的子目录，更换MODEL_NAME后不会误用旧模型的导出结果
+        export_dir = os.path.join(
+            config.onnx_dir, hashlib.sha1(self.model_name.encode("utf-8")).hexdigest()[:16]
+        )
+
+        if os.path.exists(os.path.join(export_dir, file_name)):
+            self.logger.info("复用已导出的ONNX模型: %s", os.path.join(export_dir, file_name))
+        else:
+            ort_model = ORTModelForSequenceClassification.from_pretrained(
+                self.model_name, export=True, provider=provider
+            )
+            if use_cuda:
+                ort_model.save_pretrained(export_dir)
+            else:
+                from optimum.onnxruntime import ORTQuantizer
+                from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+                quantizer = ORTQuantizer.from_pretrained(ort_model)
+                quantizer.quantize(
+                    save_dir=export_dir,
+                    quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+                )
+
+        ort_model = ORTModelForSequenceClassification.from_pretrained(
+            export_dir, file_name=file_name, provider=provider
+        )
+        self.logger.info("已启用ONNX Runtime%s推理", "" if use_cuda else " INT8量化")
+        return ort_model
+
+    def warmup(self):
+        """预热模型，需在实际执行推理的线程中调用"""
         self.logger.info("开始模型预热...")
         warmup_queries = [
             ("军队体检视力标准", "视力检查要求双眼裸眼视力不低于4.8"),
@@ -70,11 +205,42 @@ class BGEReranker:
         ]
 
         try:
-            for i in range(5):  # 预热3轮
-                self.model.predict(warmup_queries, batch_size=2, show_progress_bar=False)
-            self.logger.info("模型预热完成")
+            self._run_warmup(warmup_queries[0])
         except Exception as e:
-            self.logger.warning(f"模型预热失败: {str(e)}")
+            if not self._restore_eager_model():
+                self.logger.warning("模型预热失败: %s", e)
+                return
+            self.logger.warning("torch.compile编译失败，已恢复为eager模式: %s", e)
+            try:
+                self._run_warmup(warmup_queries[0])
+            except Exception as e:
+                self.logger.warning("模型预热失败: %s", e)
+                return
+        self.logger.info("模型预热完成")
+
+    def _run_warmup(self, warmup_pair: Tuple[str, str]):
+        """按常用batch_size和文档长度执行推理"""
+        query, sentence = warmup_pair
+
+        # CPU上没有cuDNN调优和torch.compile，只用单一形状跑一次推理
+        if not (self.device == "cuda" and torch.cuda.is_available()):
+            scores = self._predict_grouped([(query, [sentence] * 2)], 2)[0]
+            # 触发分数统计kernel的编译，避免首个真实请求承担编译耗时
+            _score_stats(scores)
+            return
+
+        # 覆盖常用batch_size和各序列长度桶，提前完成kernel选择和各形状的编译
+        sentence_tokens = len(self.tokenizer(sentence, add_special_tokens=False)["input_ids"])
+        overhead = (len(self.tokenizer(query, add_special_tokens=False)["input_ids"])
+                    + len(self._pair_prefix) + len(self._pair_middle) + len(self._pair_suffix))
+        for bucket in range(COMPILE_LENGTH_BUCKET, config.max_length + COMPILE_LENGTH_BUCKET, COMPILE_LENGTH_BUCKET):
+            # 句对总长度落在(bucket - COMPILE_LENGTH_BUCKET, bucket]区间内
+            document = sentence * max(1, (min(bucket, config.max_length) - overhead) // sentence_tokens)
+            for batch_size in (1, 4, 8, 16, 32):
+                scores = self._predict_grouped([(query, [document] * batch_size)], batch_size)[0]
+
+        _score_stats(scores)
+        torch.cuda.synchronize()
 
     # def _warmup_2(self):
     #     self.logger.info("开始模型预热 (使用真实业务样本)...")
@@ -90,75 +256,207 @@ class BGEReranker:
     #     except Exception as e:
     #         self.logger.warning(f"模型预热失败: {str(e)}")
 
+    def _build_pair_template(self):
+        """由分词器推导句对的特殊符号模板：prefix + query + middle + doc + suffix"""
+        query_ids = self.tokenizer("query", add_special_tokens=False)["input_ids"]
+        doc_ids = self.tokenizer("document", add_special_tokens=False)["input_ids"]
+        ids = self.tokenizer("query", "document")["input_ids"]
+
+        query_pos = _find_subsequence(ids, query_ids, 0)
+        doc_pos = _find_subsequence(ids, doc_ids, query_pos + len(query_ids))
+        self._pair_prefix = ids[:query_pos]
+        self._pair_middle = ids[query_pos + len(query_ids):doc_pos]
+        self._pair_suffix = np.asarray(ids[doc_pos + len(doc_ids):], dtype=np.int64)
+
+    def _predict_grouped(self, groups: List[Tuple[str, List[str]]], batch_size: int) -> List[np.ndarray]:
+        """多组(query, documents)合并推理，每个查询只分词一次，文档批量分词"""
+        num_special = len(self._pair_prefix) + len(self._pair_middle) + len(self._pair_suffix)
+        budget = config.max_length - num_special
+
+        queries_ids = self.tokenizer(
+            [query for query, _ in groups],
+            add_special_tokens=False
+        )["input_ids"]
+        doc_ids_list = self.tokenizer(
+            [doc for _, documents in groups for doc in documents],
+            add_special_tokens=False,
+            truncation=True,
+            max_length=budget
+        )["input_ids"]
+
+        # 每对输入由“查询头部”(prefix + query + middle)和文档拼接而成，查询头部每组只构建一次
+        # 截断规则与longest_first一致：总长超出时优先截断较长的一方
+        items = []
+        offset = 0
+        for query_ids, (_, documents) in zip(queries_ids, groups):
+            heads = {}
+            for doc_ids in doc_ids_list[offset:offset + len(documents)]:
+                query_keep = min(len(query_ids), max(budget - len(doc_ids), budget // 2))
+                head = heads.get(query_keep)
+                if head is None:
+                    head = np.asarray(
+                        self._pair_prefix + query_ids[:query_keep] + self._pair_middle, dtype=np.int64
+                    )
+                    heads[query_keep] = head
+                items.append((head, doc_ids[:budget - query_keep]))
+            offset += len(documents)
+
+        # 按长度排序后分批，减少同一批内的padding，推理结束后再还原顺序
+        suffix = self._pair_suffix
+        lengths = np.array([len(head) + len(doc_ids) + len(suffix) for head, doc_ids in items])
+        perm = np.argsort(lengths, kind="stable")
+
+        use_cuda = self.device == "cuda" and torch.cuda.is_available()
+        all_scores = []
+        # inference_mode跳过autograd记录；GPU上使用锁页内存+异步拷贝，与计算重叠
+        with torch.inference_mode(), torch.autocast(
+                device_type="cuda", dtype=torch.float16, enabled=use_cuda and config.use_fp16):
+            for start in range(0, len(items), batch_size):
+                batch = self._build_batch(items, lengths, perm[start:start + batch_size])
+                if use_cuda and not config.use_onnx:
+                    batch = {name: self._to_device(name, tensor) for name, tensor in batch.items()}
+                else:
+                    # ONNX Runtime在自己的CUDA stream上读取输入，不会等待torch stream上的异步拷贝，
+                    # 因此使用同步拷贝，且不复用共享缓冲区
+                    batch = {name: tensor.to(self.device) for name, tensor in batch.items()}
+                logits = self._forward(**batch).logits
+                scores = self.model.activation_fn(logits).squeeze(-1)
+                all_scores.append(scores.float().cpu().numpy())
+
+        scores_perm = np.concatenate(all_scores)
+        scores = np.empty_like(scores_perm)
+        scores[perm] = scores_perm
+        return np.split(scores, np.cumsum([len(documents) for _, documents in groups])[:-1])
+
+    def _build_batch(self, items, lengths: np.ndarray, indices: np.ndarray) -> Dict[str, torch.Tensor]:
+        """用numpy直接拼接一批输入并右侧padding"""
+        suffix = self._pair_suffix
+        seq_len = int(lengths[indices].max())
+        seq_len = min(-(-seq_len // self._pad_multiple) * self._pad_multiple, config.max_length)
+        input_ids = np.full((len(indices), seq_len), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(indices), seq_len), dtype=np.int64)
+        token_type_ids = None
+        if "token_type_ids" in self.tokenizer.model_input_names:
+            token_type_ids = np.zeros((len(indices), seq_len), dtype=np.int64)
+
+        for row, index in enumerate(indices):
+            head, doc_ids = items[index]
+            head_len, total_len = len(head), lengths[index]
+            input_ids[row, :head_len] = head
+            input_ids[row, head_len:total_len - len(suffix)] = doc_ids
+            input_ids[row, total_len - len(suffix):total_len] = suffix
+            attention_mask[row, :total_len] = 1
+            if token_type_ids is not None:
+                token_type_ids[row, head_len:total_len] = 1
+
+        batch = {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask)
+        }
+        if token_type_ids is not None:
+            batch["token_type_ids"] = torch.from_numpy(token_type_ids)
+        return batch
+
+    def _to_device(self, name: str, tensor: torch.Tensor) -> torch.Tensor:
+        """经锁页内存异步拷贝到GPU，容量足够时复用预分配的缓冲区"""
+        buffer = self._input_buffers.get(name)
+        if buffer is None or tensor.dtype != buffer.dtype or tensor.numel() > buffer.numel():
+            return tensor.pin_memory().to(self.device, non_blocking=True)
+
+        # 取缓冲区前段连续内存作为当前批次的输入
+        view = buffer[:tensor.numel()].view(tensor.shape)
+        view.copy_(tensor.pin_memory(), non_blocking=True)
+        return view
+
     def rerank(self,
                query: str,
                documents: List[str],
                top_k: Optional[int] = None,
                batch_size: Optional[int] = None) -> Tuple[List[str], List[float], Dict[str, Any]]:
         """执行重排序"""
+        return self.rerank_batch([(query, documents, top_k)], batch_size)[0]
+
+    def rerank_batch(self,
+                     requests: List[Tuple[str, List[str], Optional[int]]],
+                     batch_size: Optional[int] = None) -> List[Tuple[List[str], List[float], Dict[str, Any]]]:
+        """合并多个(query, documents, top_k)请求，一次推理后分别排序"""
         if not self.is_loaded or self.model is None:
             raise RuntimeError("模型未加载")
 
-        if not documents:
-            return [], [], {"processing_time": 0, "documents_processed": 0}
-
-        if top_k is None:
-            top_k = len(documents)
         if batch_size is None:
             batch_size = config.batch_size
 
-        self.logger.debug(f"重排序请求: 查询长度={len(query)}, 文档数量={len(documents)}, top_k={top_k}")
+        groups = [(query, documents) for query, documents, _ in requests if documents]
+        for query, documents, top_k in requests:
+            self.logger.debug(
+                "重排序请求: 查询长度=%d, 文档数量=%d, top_k=%d",
+                len(query), len(documents), top_k if top_k is not None else len(documents)
+            )
 
         start_time = time.time()
-        self.total_queries += 1
+        self.total_queries += len(groups)
 
         try:
-            # 因为显存够，这里没有分批处理（避免显存溢出）
             # 每对(query, doc)的总长度不能超过max_length
-            pairs = [(query, doc) for doc in documents]
             # 执行推理
-            scores = self.model.predict(
-                pairs,
-                batch_size=batch_size,
-                show_progress_bar=False,
-                convert_to_numpy=True
-            )
-            # 转换为numpy数组（如果返回的是tensor）
-            # if hasattr(scores, 'cpu'):
-            #     scores = scores.cpu().numpy()
-            # scores = np.array(scores)
-
-            # 排序和选择top_k
-            scored_docs = list(zip(documents, scores))
-            scored_docs.sort(key=lambda x: x[1], reverse=True)
-
-            ranked_documents = [doc for doc, score in scored_docs[:top_k]]
-            ranked_scores = [float(score) for doc, score in scored_docs[:top_k]]
-
-            processing_time = time.time() - start_time
-            self.total_processing_time += processing_time
-
-            # 记录性能指标
-            metrics = {
-                "processing_time": processing_time,
-                "documents_processed": len(documents),
-                "batch_size": batch_size,
-                "average_score": float(np.mean(scores)) if len(scores) > 0 else 0.0,
-                "max_score": float(np.max(scores)) if len(scores) > 0 else 0.0,
-                "min_score": float(np.min(scores)) if len(scores) > 0 else 0.0
-            }
-
-            self.logger.info(
-                f"重排序完成: {len(documents)}文档 -> {top_k}结果, "
-                f"耗时{processing_time:.3f}秒, 平均分{metrics['average_score']:.4f}"
-            )
+            grouped_scores = iter(self._predict_grouped(groups, batch_size) if groups else [])
+
+            results = []
+            for _, documents, top_k in requests:
+                if not documents:
+                    results.append(([], [], {"processing_time": 0, "documents_processed": 0}))
+                    continue
+                results.append(self._rank(documents, next(grouped_scores), top_k, batch_size, start_time))
 
-            return ranked_documents, ranked_scores, metrics
+            # 合并推理的耗时只计一次，平均处理时间按请求数分摊
+            self.total_processing_time += time.time() - start_time
+            return results
 
         except Exception as e:
-            self.logger.error(f"重排序处理失败: {str(e)}", exc_info=True)
+            self.logger.error("重排序处理失败: %s", e, exc_info=True)
             raise
 
+    def _rank(self,
+              documents: List[str],
+              scores: np.ndarray,
+              top_k: Optional[int],
+              batch_size: int,
+              start_time: float) -> Tuple[List[str], List[float], Dict[str, Any]]:
+        """根据分数选择top_k并生成性能指标"""
+        if top_k is None:
+            top_k = len(documents)
+
+        # 选择top_k：argpartition为O(N)，只对前top_k个结果排序
+        order = np.argpartition(-scores, min(top_k, len(scores) - 1))[:top_k]
+        order = order[np.argsort(-scores[order])]
+
+        ranked_documents = [documents[i] for i in order.tolist()]
+        ranked_scores = scores[order].tolist()
+
+        processing_time = time.time() - start_time
+
+        # 记录性能指标
+        average_score, min_score, max_score = _score_stats(scores) if scores.size > 0 else (0.0, 0.0, 0.0)
+        metrics = {
+            "processing_time": processing_time,
+            "documents_processed": len(documents),
+            "batch_size": batch_size,
+            "average_score": average_score,
+            "max_score": max_score,
+            "min_score": min_score
+        }
+
+        self.logger.info(
+            "重排序完成: %d文档 -> %d结果, 耗时%.3f秒, 平均分%.4f",
+            len(documents), top_k, processing_time, metrics['average_score']
+        )
+
+        return ranked_documents, ranked_scores, metrics
+
+    def record_cached_query(self):
+        """统计命中响应缓存的请求（不计入total_queries，平均处理时间只反映实际推理）"""
+        self.cache_hits += 1
+
     def get_model_info(self) -> Dict[str, Any]:
         """获取模型信息"""
         avg_time = 0
@@ -172,6 +470,7 @@ class BGEReranker:
             "load_time": self.load_time,
             "total_queries": self.total_queries,
             "average_processing_time": avg_time,
+            "cache_hits": self.cache_hits,
             "max_length": config.max_length
         }
 
@@ -0,0 +1,123 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from typing import List, Tuple, Optional, Dict, Any
+
+from config.service_config import config
+from config.logging_config import logger
+from server.model.bge_reranker import reranker_model, BGEReranker
+
+
+class RerankBatcher:
+    """动态批处理：合并时间窗口内的并发重排序请求，一次前向推理完成"""
+
+    def __init__(self, reranker: BGEReranker):
+        self.logger = logger.getChild('batcher')
+        self.reranker = reranker
+        self.max_documents = config.max_batch_documents
+        self.max_wait = config.batch_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """启动后台批处理任务"""
+        # 单线程执行器：GPU推理串行执行，且不占用事件循环的默认线程池
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def warmup(self):
+        """在推理线程中预热模型，使预热的kernel和编译结果与实际请求使用同一线程"""
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.reranker.warmup)
+
+    async def stop(self):
+        """停止后台批处理任务，未处理的请求返回异常"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        if self._executor is not None:
+            # 在默认线程池中等待推理线程结束，不阻塞事件循环
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+            self._executor = None
+
+        while self._queue is not None and not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("服务正在关闭"))
+
+    async def rerank(self,
+                     query: str,
+                     documents: List[str],
+                     top_k: Optional[int] = None,
+                     batch_size: Optional[int] = None) -> Tuple[List[str], List[float], Dict[str, Any]]:
+        """提交重排序请求并等待合并推理的结果"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, documents, top_k, batch_size or config.batch_size, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        pending = None
+        batch = []
+
+        try:
+            while True:
+                first = pending if pending is not None else await self._queue.get()
+                pending = None
+                batch = [first]
+                num_documents = len(first[1])
+                deadline = loop.time() + self.max_wait
+
+                # 在时间窗口内继续收集请求，batch_size不同或超出文档上限的留到下一批
+                while num_documents < self.max_documents:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if item[3] != first[3] or num_documents + len(item[1]) > self.max_documents:
+                        pending = item
+                        break
+                    batch.append(item)
+                    num_documents += len(item[1])
+
+                await self._run_batch(batch)
+        finally:
+            # 任务被取消时，正在处理和暂存的请求同样返回异常
+            for *_, future in batch + ([pending] if pending is not None else []):
+                if not future.done():
+                    future.set_exception(RuntimeError("服务正在关闭"))
+
+    async def _run_batch(self, batch):
+        # 跳过客户端已断开的请求
+        batch = [item for item in batch if not item[-1].done()]
+        if not batch:
+            return
+
+        requests = [(query, documents, top_k) for query, documents, top_k, _, _ in batch]
+        self.logger.debug("合并推理: 请求数=%d", len(requests))
+
+        try:
+            # GPU推理放到专用线程执行，避免阻塞事件循环
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.reranker.rerank_batch, requests, batch[0][3]
+            )
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# 全局批处理实例
+rerank_batcher = RerankBatcher(reranker_model)
@@ -0,0 +1,50 @@
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional
+
+from config.service_config import config
+
+
+def make_cache_key(query: str, documents: List[str], top_k: Optional[int], batch_size: int) -> bytes:
+    """由请求内容计算缓存键（blake2b摘要），缓存中不保留原始文档"""
+    digest = hashlib.blake2b(digest_size=16)
+    for text in (query, *documents):
+        data = text.encode("utf-8")
+        # 带长度前缀，避免不同的文档切分得到相同的摘要输入
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    digest.update(f"{top_k}|{batch_size}".encode())
+    return digest.digest()
+
+
+class ResponseCache:
+    """LRU缓存：保存已序列化的响应字节，按总字节数限制容量"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._size = 0
+        self._data: "OrderedDict[bytes, bytes]" = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """获取缓存并标记为最近使用"""
+        content = self._data.get(key)
+        if content is not None:
+            self._data.move_to_end(key)
+        return content
+
+    def put(self, key: bytes, content: bytes):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if len(content) > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._data[key] = content
+        self._size += len(content)
+        while self._size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self._size -= len(evicted)
+
+
+# 全局响应缓存实例
+response_cache = ResponseCache(config.response_cache_max_mb * 1024 * 1024)